@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Record -> replay regression check for the Gemini cassette (no network, no API key).
+
+Records request_structured_json() for several ideas in one process against a
+stand-in client that enforces the pinned SDK's Models.generate_content /
+Models.list signatures (so the drift probes raise TypeError exactly as they do
+against the real SDK), then replays the cassette offline and checks that every
+idea gets back the same JSON.
+
+Usage:
+  python app/check_cassette.py [--keep DIR]
+
+Exit codes:
+  0 - replay matched the recording
+  1 - replay failed or differed
+"""
+
+import argparse
+import inspect
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from google.genai import models as genai_models
+
+import gemini_cassette
+from main_ai_studio import log, request_structured_json
+
+IDEAS = [
+    "Hunt for PowerShell download cradles (T1059.001, T1105)",
+    "Hunt for scheduled task persistence on servers (T1053)",
+    "Hunt for LSASS memory access by non-system processes (T1003)",
+]
+
+class _SdkSignatureModels:
+    """Serves fake reports, but only for kwargs the pinned SDK would accept."""
+
+    def generate_content(self, **kwargs):
+        inspect.signature(genai_models.Models.generate_content).bind(self, **kwargs)
+        return gemini_cassette.FakeClient().models.generate_content(**kwargs)
+
+    def list(self, **kwargs) -> List[Any]:
+        inspect.signature(genai_models.Models.list).bind(self, **kwargs)
+        return [SimpleNamespace(name="models/gemini-2.5-flash")]
+
+class _SdkSignatureClient:
+    def __init__(self, api_key: str = ""):
+        self.models = _SdkSignatureModels()
+
+def _run_suite(mode: str, cassette: str) -> Dict[str, Dict]:
+    os.environ["GEMINI_CASSETTE_MODE"] = mode
+    os.environ["GEMINI_CASSETTE"] = cassette
+    gemini_cassette.reset_cassettes()
+    return {
+        idea: request_structured_json("", "You are a CTA report generator.", f"THREAT HUNT IDEA:\n{idea}\n", "gemini-2.5-flash")
+        for idea in IDEAS
+    }
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Gemini cassette record/replay regression check")
+    parser.add_argument("--keep", default="", help="Directory to keep the recorded cassette in")
+    args = parser.parse_args(argv)
+
+    work = args.keep or tempfile.mkdtemp(prefix="cassette-check-")
+    cassette = os.path.join(work, "gemini.json")
+    real_client = gemini_cassette.genai.Client
+    gemini_cassette.genai.Client = _SdkSignatureClient
+    try:
+        recorded = _run_suite("record", cassette)
+        gemini_cassette.genai.Client = None  # replay must not construct a client
+        replayed = _run_suite("replay", cassette)
+    except Exception as e:
+        log(f"ERROR: cassette check failed: {e}")
+        return 1
+    finally:
+        gemini_cassette.genai.Client = real_client
+        os.environ.pop("GEMINI_CASSETTE_MODE", None)
+        os.environ.pop("GEMINI_CASSETTE", None)
+
+    with open(cassette, "r", encoding="utf-8") as f:
+        interactions = json.load(f)["interactions"]
+    kinds = sorted({rec["kind"] for rec in interactions})
+    mismatched = [idea for idea in IDEAS if recorded[idea] != replayed[idea]]
+    if mismatched:
+        log(f"ERROR: replay differs from recording for: {mismatched}")
+        return 1
+    log(f"Cassette check OK: {len(IDEAS)} idea(s), {len(interactions)} interaction(s) ({', '.join(kinds)}) in {cassette}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+CTA DOCX styling helpers shared by the DOCX report writers.
+- Header/footer banners, base styles and cover page
+- Section writer used for every CTA section
+- Bulk OOXML table writer for large evidence tables (appendices, findings)
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.shared import Pt, Inches
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import nsdecls
+from docx.oxml.parser import element_class_lookup
+from docx.table import Table
+from lxml import etree
+
+# ----------------------------
+# DOCX helpers (CTA styling)
+# ----------------------------
+def stamp_header_footer(doc: Document):
+    # Add CTA header/footer; avoid clearing if template already has content
+    section = doc.sections[0]
+
+    # Header
+    hp1 = section.header.add_paragraph()
+    r1 = hp1.add_run("TRUST IN DISA – MISSION FIRST, PEOPLE ALWAYS")
+    r1.bold = True
+    hp1.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    hp2 = section.header.add_paragraph()
+    r2 = hp2.add_run("CUI//FEDCON")
+    r2.bold = True
+    hp2.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    # Footer
+    fp1 = section.footer.add_paragraph(
+        "Controlled By: Defense Information Systems Agency (DISA) "
+        "DEOS Program Management Office (PMO) (DISA SD3)"
+    )
+    fp1.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    fp2 = section.footer.add_paragraph(
+        "CUI Category: General Proprietary Business Information\n"
+        "Limited Dissemination Control: Federal Employees and Contractors Only (FEDCON)"
+    )
+    fp2.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+def set_styles(doc: Document):
+    normal = doc.styles["Normal"]
+    normal.font.name = "Calibri"
+    normal.font.size = Pt(11)
+
+    h1 = doc.styles["Heading 1"]
+    h1.font.name = "Calibri"
+    h1.font.size = Pt(16)
+    h1.font.bold = True
+
+    h2 = doc.styles["Heading 2"]
+    h2.font.name = "Calibri"
+    h2.font.size = Pt(13)
+    h2.font.bold = True
+
+    section = doc.sections[0]
+    section.top_margin = Inches(1)
+    section.bottom_margin = Inches(1)
+    section.left_margin = Inches(1)
+    section.right_margin = Inches(1)
+
+# Cover metadata block: (metadata KEY, label), same fields as the markdown template
+COVER_METADATA = [
+    ("AUTHOR", "Author"),
+    ("CYCLE_NUMBER", "CTA Cycle"),
+    ("DATE", "Date"),
+    ("ENVIRONMENT", "Customer / Environment"),
+    ("CLASSIFICATION", "Classification"),
+    ("REVISION", "Revision"),
+    ("POC", "POC"),
+]
+
+def add_cover(doc: Document, prepared_by: str, metadata: Optional[Dict[str, str]] = None):
+    metadata = metadata or {}
+    p = doc.add_paragraph(style="Title")
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    p.add_run("Threat Hunt Report").bold = True
+
+    # Hunt title / technique and metadata block, when the model supplied them
+    if metadata.get("HUNT_TITLE"):
+        t = doc.add_paragraph(metadata["HUNT_TITLE"], style="Subtitle")
+        t.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    technique = " – ".join(v for v in (metadata.get("ATTACK_ID"), metadata.get("ATTACK_NAME")) if v)
+    if technique:
+        tp = doc.add_paragraph()
+        tp.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        tp.add_run(f"Technique: {technique}").bold = True
+    for key, label in COVER_METADATA:
+        if metadata.get(key):
+            mp = doc.add_paragraph()
+            mp.add_run(f"{label}: ").bold = True
+            mp.add_run(metadata[key])
+
+    meta = doc.add_paragraph()
+    meta.add_run("Controlled Unclassified Information (CUI)\n").bold = True
+
+    doc.add_paragraph(f"Prepared by: {prepared_by}")
+    doc.add_paragraph("Document Owner: DEOS Program Management Office")
+    doc.add_paragraph("OPR: DISA SD3")
+    doc.add_paragraph(
+        f"CUI DESIGNATION INDICATOR: CUI Category: "
+        f"{metadata.get('CUI_CATEGORY') or 'General Proprietary Business Information'}\n"
+        f"Dissemination: {metadata.get('DISSEMINATION') or 'FEDCON'}"
+    )
+
+    disclaimer = doc.add_paragraph()
+    disclaimer.add_run(
+        "DISCLAIMER\n"
+        "The contents of this document are not to be construed as an official Defense Information Systems Agency document "
+        "unless so designated by other authorized documents. The use of trade names in this document does not constitute "
+        "an official endorsement or approval. Do not cite this document for the purpose of advertisement."
+    )
+
+def add_section(doc: Document, title: str, body):
+    doc.add_paragraph(title, style="Heading 1")
+    if isinstance(body, list):
+        for item in body:
+            doc.add_paragraph(str(item))
+    else:
+        doc.add_paragraph(str(body) if body else "[Insert content]")
+
+# ----------------------------
+# Bulk table writer (raw OOXML)
+# ----------------------------
+# python-docx's per-cell API (table.cell(r, c).text = ...) is O(rows * cols) proxy
+# work and takes minutes at appendix scale. Instead, table XML is generated as text
+# row by row and fed incrementally into an lxml parser, then the finished <w:tbl>
+# is inserted into the body once.
+
+TWIPS_PER_INCH = 1440
+CTA_TABLE_WIDTH_IN = 6.5              # page width inside the 1" CTA margins
+CTA_TABLE_HEADER_FILL = "1F3864"      # CTA navy
+CTA_TABLE_HEADER_COLOR = "FFFFFF"
+CTA_TABLE_BORDER_COLOR = "808080"
+CTA_TABLE_FONT_HALF_PTS = 18          # 9pt
+TABLE_FEED_BATCH_ROWS = 500
+
+# Characters not allowed in XML 1.0 (often present in raw command lines)
+_RE_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+def _column_widths_twips(n_cols: int, col_widths: Optional[Sequence[float]]) -> List[int]:
+    """Column widths in inches -> twips; equal split of the CTA text width by default."""
+    if col_widths and len(col_widths) == n_cols:
+        return [max(1, int(w * TWIPS_PER_INCH)) for w in col_widths]
+    each = int(CTA_TABLE_WIDTH_IN * TWIPS_PER_INCH / max(1, n_cols))
+    return [each] * n_cols
+
+def _cell_xml(value: Any, width: int, header: bool = False) -> str:
+    text = _RE_XML_ILLEGAL.sub("", "" if value is None else str(value))
+    runs = "<w:br/>".join(
+        f'<w:t xml:space="preserve">{escape(line)}</w:t>' for line in text.split("\n")
+    )
+    if header:
+        rpr = (f'<w:rPr><w:b/><w:color w:val="{CTA_TABLE_HEADER_COLOR}"/>'
+               f'<w:sz w:val="{CTA_TABLE_FONT_HALF_PTS}"/></w:rPr>')
+        shd = f'<w:shd w:val="clear" w:color="auto" w:fill="{CTA_TABLE_HEADER_FILL}"/>'
+    else:
+        rpr = f'<w:rPr><w:sz w:val="{CTA_TABLE_FONT_HALF_PTS}"/></w:rPr>'
+        shd = ""
+    return (
+        f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/>{shd}</w:tcPr>'
+        f'<w:p><w:pPr><w:spacing w:before="0" w:after="0"/></w:pPr>'
+        f'<w:r>{rpr}{runs}</w:r></w:p></w:tc>'
+    )
+
+def _row_values(row: Any, columns: Sequence[str]) -> List[Any]:
+    """Accept sequences or dicts keyed by column name; pad/truncate to the column count."""
+    if isinstance(row, dict):
+        return [row.get(c, "") for c in columns]
+    values = list(row)
+    if len(values) < len(columns):
+        values.extend([""] * (len(columns) - len(values)))
+    return values[:len(columns)]
+
+def _table_xml_chunks(columns: Sequence[str], rows: Iterable[Any], widths: List[int], repeat_header: bool):
+    """Yield the <w:tbl> document in chunks so large row iterables are never fully materialized."""
+    border = f'w:val="single" w:sz="4" w:space="0" w:color="{CTA_TABLE_BORDER_COLOR}"'
+    yield (
+        f'<w:tbl {nsdecls("w")}>'
+        f'<w:tblPr><w:tblW w:w="{sum(widths)}" w:type="dxa"/>'
+        f'<w:tblBorders><w:top {border}/><w:left {border}/><w:bottom {border}/>'
+        f'<w:right {border}/><w:insideH {border}/><w:insideV {border}/></w:tblBorders>'
+        f'<w:tblLayout w:type="fixed"/>'
+        f'<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="0" '
+        f'w:lastColumn="0" w:noHBand="0" w:noVBand="1"/></w:tblPr>'
+        '<w:tblGrid>' + "".join(f'<w:gridCol w:w="{w}"/>' for w in widths) + '</w:tblGrid>'
+    )
+
+    header_pr = '<w:trPr><w:cantSplit/><w:tblHeader/></w:trPr>' if repeat_header else '<w:trPr><w:cantSplit/></w:trPr>'
+    yield '<w:tr>' + header_pr + "".join(_cell_xml(c, w, header=True) for c, w in zip(columns, widths)) + '</w:tr>'
+
+    batch: List[str] = []
+    for row in rows:
+        values = _row_values(row, columns)
+        batch.append('<w:tr><w:trPr><w:cantSplit/></w:trPr>'
+                     + "".join(_cell_xml(v, w) for v, w in zip(values, widths)) + '</w:tr>')
+        if len(batch) >= TABLE_FEED_BATCH_ROWS:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+    yield '</w:tbl>'
+
+def build_table_element(columns: Sequence[str], rows: Iterable[Any], col_widths: Optional[Sequence[float]] = None, repeat_header: bool = True):
+    """Build a CTA-styled <w:tbl> element from a row iterable in bulk."""
+    widths = _column_widths_twips(len(columns), col_widths)
+    # Per-call parser (feed state is not shareable across threads); same class lookup as python-docx
+    parser = etree.XMLParser(remove_blank_text=True, resolve_entities=False)
+    parser.set_element_class_lookup(element_class_lookup)
+    for chunk in _table_xml_chunks(columns, rows, widths, repeat_header):
+        parser.feed(chunk)
+    return parser.close()
+
+def add_table_bulk(doc: Document, columns: Sequence[str], rows: Iterable[Any], col_widths: Optional[Sequence[float]] = None, repeat_header: bool = True) -> Table:
+    """
+    Append a CTA-styled table to the document body.
+    rows: iterable of sequences or dicts (consumed once, streamed in batches).
+    col_widths: optional widths in inches, one per column.
+    """
+    tbl = build_table_element(columns, rows, col_widths=col_widths, repeat_header=repeat_header)
+    doc.element.body._insert_tbl(tbl)
+    return Table(tbl, doc._body)
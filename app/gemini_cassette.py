@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Record/replay transport for the Gemini client.
+
+Drop-in replacement for genai.Client(api_key=...) used by both generators.
+Controlled by environment variables so CI and local runs need no CLI changes:
+
+  GEMINI_CASSETTE_MODE   off (default) | record | replay | fake
+  GEMINI_CASSETTE        cassette file path (default: cassettes/gemini.json)
+  GEMINI_REPLAY_LATENCY  replay delay as a multiple of the recorded latency
+                         (default 0 = instant; 1 = real-time)
+  GEMINI_FAKE_LATENCY    fake-mode delay per call in seconds (default 0)
+
+record: every generate_content / generate_content_stream / models.list call is
+        passed through to the real client and saved (request fingerprint, full
+        response or stream chunks incl. usage metadata, API errors, latency).
+replay: the same calls are served from the cassette offline; no API key needed.
+        Repeated identical requests are replayed in recorded order. A request
+        that is not in the cassette raises CassetteMiss.
+        Signature TypeErrors from the SDK drift probes are recorded too and
+        replayed as TypeError, so callers fall through to the same signature.
+fake:   no cassette, no network: deterministic, schema-valid CTA JSON built
+        from the prompt. For local pipeline, queue and shard tests.
+
+One cassette is shared per path within a process, so every client created
+during a recording run (one per idea in hunt_queue.py) appends to the same
+file. Each record run starts a fresh cassette: the file left by a previous
+recording is replaced, not extended. Use one GEMINI_CASSETTE per suite.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Third-party (installed by workflow)
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+
+CASSETTE_VERSION = 1
+DEFAULT_CASSETTE = "cassettes/gemini.json"
+
+class CassetteMiss(RuntimeError):
+    """Replay mode received a request that was never recorded."""
+
+# ---------- Configuration ---------- #
+
+def cassette_mode() -> str:
+    mode = os.environ.get("GEMINI_CASSETTE_MODE", "off").strip().lower()
+    return mode if mode in ("record", "replay", "fake") else "off"
+
+def offline_mode() -> bool:
+    """True when no real API call is made (replay/fake), so GEMINI_API_KEY is optional."""
+    return cassette_mode() in ("replay", "fake")
+
+def _latency_scale() -> float:
+    try:
+        return max(0.0, float(os.environ.get("GEMINI_REPLAY_LATENCY", "0") or 0))
+    except ValueError:
+        return 0.0
+
+# ---------- Serialization ---------- #
+
+def fingerprint(kind: str, kwargs: Dict[str, Any]) -> str:
+    """Stable hash of the call kind + request arguments (model, contents, config, safety)."""
+    canon = json.dumps({"kind": kind, "request": kwargs}, sort_keys=True, default=_jsonable, ensure_ascii=False)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+def _jsonable(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    return str(obj)
+
+def _dump_response(resp: Any) -> Dict[str, Any]:
+    if hasattr(resp, "model_dump"):
+        return resp.model_dump(mode="json", exclude_none=True)
+    return {"text": getattr(resp, "text", None)}
+
+def _load_response(payload: Dict[str, Any]) -> Any:
+    try:
+        return genai_types.GenerateContentResponse.model_validate(payload)
+    except Exception:
+        return SimpleNamespace(text=payload.get("text"), candidates=None, usage_metadata=payload.get("usage_metadata"))
+
+def _dump_error(err: Exception) -> Dict[str, Any]:
+    return {
+        "type": type(err).__name__,
+        "code": getattr(err, "code", None),
+        "message": str(err),
+        "details": getattr(err, "details", None),
+    }
+
+def _raise_error(rec: Dict[str, Any]) -> None:
+    # Rebuild SDK errors so callers' `except ClientError` / NOT_FOUND handling behaves as recorded
+    cls = getattr(genai_errors, rec.get("type") or "", None)
+    if isinstance(cls, type) and issubclass(cls, genai_errors.APIError):
+        details = rec.get("details") or {"error": {"code": rec.get("code"), "message": rec.get("message")}}
+        try:
+            raise cls(rec.get("code"), details)
+        except TypeError:
+            pass
+    if rec.get("type") == "TypeError":
+        raise TypeError(rec.get("message") or "Replayed signature error")
+    raise RuntimeError(rec.get("message") or "Replayed error")
+
+# ---------- Cassette store ---------- #
+
+class Cassette:
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.interactions: List[Dict[str, Any]] = []
+        self._cursor: Dict[str, int] = {}
+        if mode == "replay":
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.interactions = data.get("interactions", [])
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            self.interactions.append(rec)
+            self._save()
+
+    def _save(self) -> None:
+        # Saved after every interaction so a crashed run still leaves a usable cassette
+        parent = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CASSETTE_VERSION, "interactions": self.interactions}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def lookup(self, fp: str) -> Dict[str, Any]:
+        with self._lock:
+            matches = [r for r in self.interactions if r["fingerprint"] == fp]
+            if not matches:
+                raise CassetteMiss(f"No recorded interaction for request {fp[:12]} in {self.path}")
+            idx = self._cursor.get(fp, 0)
+            self._cursor[fp] = idx + 1
+            return matches[min(idx, len(matches) - 1)]
+
+_CASSETTES: Dict[Tuple[str, str], Cassette] = {}
+_CASSETTES_LOCK = threading.Lock()
+
+def shared_cassette(path: str, mode: str) -> Cassette:
+    """Process-wide Cassette for a path, so repeated create_client() calls append to one recording."""
+    key = (os.path.abspath(path), mode)
+    with _CASSETTES_LOCK:
+        if key not in _CASSETTES:
+            _CASSETTES[key] = Cassette(path, mode)
+        return _CASSETTES[key]
+
+def reset_cassettes() -> None:
+    """Forget shared cassettes (the next record run starts a fresh file; replay reloads it)."""
+    with _CASSETTES_LOCK:
+        _CASSETTES.clear()
+
+# ---------- Client wrappers ---------- #
+
+class _CassetteModels:
+    def __init__(self, inner_models: Any, cassette: Cassette):
+        self._inner = inner_models
+        self._cassette = cassette
+
+    def _sleep(self, seconds: float) -> None:
+        scale = _latency_scale()
+        if scale and seconds:
+            time.sleep(seconds * scale)
+
+    def generate_content(self, **kwargs):
+        fp = fingerprint("generate_content", kwargs)
+        if self._cassette.mode == "replay":
+            rec = self._cassette.lookup(fp)
+            self._sleep(rec.get("elapsed", 0.0))
+            if "error" in rec:
+                _raise_error(rec["error"])
+            return _load_response(rec["response"])
+
+        rec: Dict[str, Any] = {"fingerprint": fp, "kind": "generate_content", "model": kwargs.get("model")}
+        start = time.perf_counter()
+        try:
+            resp = self._inner.generate_content(**kwargs)
+        except Exception as e:
+            # Includes signature TypeErrors from SDK drift probing, so replay falls through the same way
+            rec["elapsed"] = time.perf_counter() - start
+            rec["error"] = _dump_error(e)
+            self._cassette.add(rec)
+            raise
+        rec["elapsed"] = time.perf_counter() - start
+        rec["response"] = _dump_response(resp)
+        self._cassette.add(rec)
+        return resp
+
+    def generate_content_stream(self, **kwargs) -> Iterator[Any]:
+        fp = fingerprint("generate_content_stream", kwargs)
+        if self._cassette.mode == "replay":
+            return self._replay_stream(self._cassette.lookup(fp))
+        return self._record_stream(fp, kwargs)
+
+    def _replay_stream(self, rec: Dict[str, Any]) -> Iterator[Any]:
+        prev = 0.0
+        for chunk in rec.get("chunks", []):
+            self._sleep(chunk.get("offset", 0.0) - prev)
+            prev = chunk.get("offset", 0.0)
+            yield _load_response(chunk["response"])
+        if "error" in rec:
+            _raise_error(rec["error"])
+
+    def _record_stream(self, fp: str, kwargs: Dict[str, Any]) -> Iterator[Any]:
+        rec: Dict[str, Any] = {"fingerprint": fp, "kind": "generate_content_stream", "model": kwargs.get("model"), "chunks": []}
+        start = time.perf_counter()
+        try:
+            for chunk in self._inner.generate_content_stream(**kwargs):
+                rec["chunks"].append({"offset": time.perf_counter() - start, "response": _dump_response(chunk)})
+                yield chunk
+        except Exception as e:
+            rec["error"] = _dump_error(e)
+            raise
+        finally:
+            rec["elapsed"] = time.perf_counter() - start
+            self._cassette.add(rec)
+
+    def list(self, **kwargs) -> List[Any]:
+        fp = fingerprint("list", kwargs)
+        if self._cassette.mode == "replay":
+            rec = self._cassette.lookup(fp)
+            if "error" in rec:
+                _raise_error(rec["error"])
+            return [SimpleNamespace(name=n) for n in rec.get("names", [])]
+
+        rec: Dict[str, Any] = {"fingerprint": fp, "kind": "list"}
+        try:
+            models = list(self._inner.list(**kwargs))
+        except Exception as e:
+            rec["error"] = _dump_error(e)
+            self._cassette.add(rec)
+            raise
+        rec["names"] = [str(getattr(m, "name", None) or getattr(m, "model", "")) for m in models]
+        self._cassette.add(rec)
+        return models
+
+class CassetteClient:
+    """Minimal genai.Client stand-in exposing .models with record/replay."""
+
+    def __init__(self, inner: Optional[Any], cassette: Cassette):
+        self.models = _CassetteModels(getattr(inner, "models", None), cassette)
+        self.cassette = cassette
+
+# ---------- Fake backend ---------- #
+
+FAKE_SECTIONS = ["BACKGROUND", "HYPOTHESIS", "ANALYSIS", "FINDINGS", "RECOMMENDATIONS", "ADDITIONAL_RESEARCH", "APPENDIX"]
+
+def _prompt_text(contents: Any) -> str:
+    buf: List[str] = []
+    for item in contents or []:
+        for part in (item.get("parts", []) if isinstance(item, dict) else []):
+            if isinstance(part, dict) and part.get("text"):
+                buf.append(part["text"])
+    return "\n".join(buf)
+
+def fake_report(prompt: str) -> Dict[str, Any]:
+    """Deterministic CTA JSON that passes validate_cta (>=80 words, ATT&CK IDs echoed)."""
+    m = re.search(r"THREAT HUNT IDEA:\s*(.+)", prompt)
+    idea = (m.group(1).strip() if m else "Threat hunt")[:120]
+    ids = sorted(set(re.findall(r"\bT\d{4}\b", prompt))) or ["T1059"]
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    filler = " ".join(["Analysts reviewed telemetry for this technique across the enterprise."] * 12)
+    # Lowercase keys satisfy both the template generator and the DOCX script's schema
+    sections = {
+        key.lower(): f"{key.replace('_', ' ').title()} for {idea} ({', '.join(ids)}). {filler} Reference {digest}."
+        for key in FAKE_SECTIONS
+    }
+    # validate_cta applies the word minimum to Resources too
+    sections["resources"] = [
+        f"https://attack.mitre.org/techniques/{i}/ - MITRE ATT&CK technique reference used for detection scoping, "
+        f"data source mapping and analytic validation during this hunt cycle ({n})."
+        for n in range(1, 5) for i in ids
+    ]
+    return {
+        "metadata": {"HUNT_TITLE": idea, "ATTACK_ID": ids[0], "ATTACK_NAME": "", "REVISION": "Version 1.0"},
+        "sections": sections,
+    }
+
+class _FakeModels:
+    def generate_content(self, **kwargs):
+        delay = float(os.environ.get("GEMINI_FAKE_LATENCY", "0") or 0)
+        if delay > 0:
+            time.sleep(delay)
+        text = json.dumps(fake_report(_prompt_text(kwargs.get("contents"))))
+        return SimpleNamespace(text=text, candidates=None, usage_metadata=None)
+
+    def generate_content_stream(self, **kwargs) -> Iterator[Any]:
+        yield self.generate_content(**kwargs)
+
+    def list(self, **kwargs) -> List[Any]:
+        return [SimpleNamespace(name="models/fake")]
+
+class FakeClient:
+    """Offline genai.Client stand-in returning synthetic reports."""
+
+    def __init__(self):
+        self.models = _FakeModels()
+
+def create_client(api_key: str):
+    """genai.Client, wrapped in a record/replay cassette when GEMINI_CASSETTE_MODE is set."""
+    mode = cassette_mode()
+    if mode == "off":
+        return genai.Client(api_key=api_key)
+    if mode == "fake":
+        return FakeClient()
+    path = os.environ.get("GEMINI_CASSETTE", "").strip() or DEFAULT_CASSETTE
+    cassette = shared_cassette(path, mode)
+    inner = genai.Client(api_key=api_key) if mode == "record" else None
+    return CassetteClient(inner, cassette)
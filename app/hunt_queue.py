@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+Durable, resumable job queue for hunt ideas (SQLite-backed).
+
+Each idea is a job that moves through checkpointed stages:
+  prompt_built     - user prompt assembled (attachments read)
+  response_stored  - model JSON response saved
+  validated        - CTA section validation result saved
+  rendered         - outputs written (paths saved)
+
+Checkpoints are committed as each stage finishes, so an interrupted cycle
+resumes from the last completed stage of every idea; a stored model response
+is never requested (or paid for) again.
+
+Commands:
+  enqueue  - add ideas (idempotent: the same idea + options maps to one job)
+  run      - process queued jobs by priority (highest first)
+  cycle    - enqueue + run in one step (what each shard runner executes)
+  resume   - requeue jobs left 'running' by a crashed/cancelled process, then run
+             (jobs already at --max-attempts are marked failed instead)
+  retry    - requeue failed jobs (checkpoints kept unless --reset)
+  status   - print job states as JSON
+
+Sharding: enqueue/cycle accept --shard i/N (1-based). Ideas are partitioned by a
+stable hash of the idea text, so N independent runners given the same ideas
+file each take a disjoint slice. Give every shard its own --db/--output-dir and
+combine them afterwards with app/merge_shards.py.
+
+Exit codes:
+  1 - invalid CLI usage / nothing to enqueue
+  2 - missing GEMINI_API_KEY
+  3 - system prompt file missing/unreadable
+  8 - one or more jobs failed
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import traceback
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from gemini_cassette import offline_mode
+from main_ai_studio import (
+    assemble_json_prompt,
+    log,
+    log_sdk_versions,
+    request_structured_json,
+    validate_report,
+)
+from report_model import (
+    WRITERS,
+    WriterOptions,
+    normalize_report,
+    render_markdown,
+    table_from_csv,
+    table_section,
+    write_outputs,
+)
+
+STAGES = ["prompt_built", "response_stored", "validated", "rendered"]
+
+DEFAULT_DB = "output/hunt_queue.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_key     TEXT NOT NULL UNIQUE,
+    idea        TEXT NOT NULL,
+    options     TEXT NOT NULL,
+    priority    INTEGER NOT NULL DEFAULT 0,
+    state       TEXT NOT NULL DEFAULT 'queued',
+    stage       TEXT NOT NULL DEFAULT '',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT NOT NULL DEFAULT '',
+    shard       TEXT NOT NULL DEFAULT '',
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, priority DESC, id);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id      INTEGER NOT NULL REFERENCES jobs(id),
+    stage       TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    PRIMARY KEY (job_id, stage)
+);
+"""
+
+class JobRejected(Exception):
+    """Job failed for a reason a retry cannot fix (e.g. strict validation)."""
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+def job_key(idea: str, options: Dict[str, Any]) -> str:
+    canon = json.dumps({"idea": idea.strip(), "options": options}, sort_keys=True)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+def slugify(text: str, max_len: int = 40) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", text).strip("-").lower()
+    return slug[:max_len].rstrip("-") or "idea"
+
+def read_ideas_file(path: str) -> List[str]:
+    """One idea per line; blank lines and '#' comments are skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [l.strip() for l in f if l.strip() and not l.lstrip().startswith("#")]
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/N' (1-based) -> (i, N); raises ValueError on malformed specs."""
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec or "")
+    if not m:
+        raise ValueError(f"Invalid shard spec {spec!r}; expected i/N, e.g. 2/4")
+    i, n = int(m.group(1)), int(m.group(2))
+    if n < 1 or not 1 <= i <= n:
+        raise ValueError(f"Invalid shard spec {spec!r}; need 1 <= i <= N")
+    return i, n
+
+def shard_of(idea: str, n: int) -> int:
+    """Stable 1-based shard for an idea (sha256, not Python's per-process hash())."""
+    digest = hashlib.sha256(idea.strip().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n + 1
+
+def partition_ideas(ideas: List[str], i: int, n: int) -> List[str]:
+    return [idea for idea in ideas if shard_of(idea, n) == i]
+
+# ---------- Queue Store ---------- #
+
+class JobQueue:
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        # Columns added after the first release of the queue schema
+        cols = {r["name"] for r in self.conn.execute("PRAGMA table_info(jobs)").fetchall()}
+        if "shard" not in cols:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN shard TEXT NOT NULL DEFAULT ''")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def enqueue(self, idea: str, options: Dict[str, Any], priority: int = 0, shard: str = "") -> int:
+        """Insert a job, or return the existing job id for the same idea + options."""
+        key = job_key(idea, options)
+        ts = _now()
+        self.conn.execute(
+            "INSERT OR IGNORE INTO jobs (job_key, idea, options, priority, shard, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, idea.strip(), json.dumps(options, sort_keys=True), priority, shard, ts, ts),
+        )
+        row = self.conn.execute("SELECT id FROM jobs WHERE job_key = ?", (key,)).fetchone()
+        return int(row["id"])
+
+    def claim_next(self) -> Optional[sqlite3.Row]:
+        """Atomically move the highest-priority queued job to 'running'."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (_now(), row["id"]),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def checkpoint(self, job_id: int, stage: str) -> Optional[Any]:
+        row = self.conn.execute(
+            "SELECT payload FROM checkpoints WHERE job_id = ? AND stage = ?", (job_id, stage)
+        ).fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def save_checkpoint(self, job_id: int, stage: str, payload: Any) -> None:
+        ts = _now()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (job_id, stage, payload, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, stage, json.dumps(payload), ts),
+            )
+            self.conn.execute("UPDATE jobs SET stage = ?, updated_at = ? WHERE id = ?", (stage, ts, job_id))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def finish(self, job_id: int) -> None:
+        self._set_state(job_id, "done", "")
+
+    def fail(self, job_id: int, error: str, retry: bool) -> None:
+        self._set_state(job_id, "queued" if retry else "failed", error)
+
+    def _set_state(self, job_id: int, state: str, error: str) -> None:
+        self.conn.execute(
+            "UPDATE jobs SET state = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            (state, error, _now(), job_id),
+        )
+
+    def requeue_interrupted(self, max_attempts: int = 3) -> Tuple[int, int]:
+        """Requeue jobs left 'running' by a dead process; fail those already at max_attempts. Returns (requeued, failed)."""
+        ts = _now()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = self.conn.execute(
+                "UPDATE jobs SET state = 'failed', last_error = ?, updated_at = ? "
+                "WHERE state = 'running' AND attempts >= ?",
+                ("Process died during the job; attempt limit reached", ts, max_attempts),
+            ).rowcount
+            requeued = self.conn.execute(
+                "UPDATE jobs SET state = 'queued', updated_at = ? WHERE state = 'running'", (ts,)
+            ).rowcount
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return requeued, failed
+
+    def retry_failed(self, job_id: Optional[int] = None, reset: bool = False) -> int:
+        where = "state = 'failed'" + (" AND id = ?" if job_id is not None else "")
+        params: List[Any] = [job_id] if job_id is not None else []
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if reset:
+                self.conn.execute(f"DELETE FROM checkpoints WHERE job_id IN (SELECT id FROM jobs WHERE {where})", params)
+                self.conn.execute(f"UPDATE jobs SET stage = '' WHERE {where}", params)
+            cur = self.conn.execute(
+                f"UPDATE jobs SET state = 'queued', attempts = 0, last_error = '', updated_at = ? WHERE {where}",
+                [_now()] + params,
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT id, idea, priority, state, stage, attempts, last_error, shard, updated_at FROM jobs ORDER BY id"
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {r["state"]: int(r["n"]) for r in rows}
+
+# ---------- Stage Runner ---------- #
+
+def output_targets(job_id: int, idea: str, options: Dict[str, Any]) -> Dict[str, str]:
+    base = os.path.join(options["output_dir"], f"{job_id:04d}-{slugify(idea)}")
+    names = {
+        "markdown": "threat_hunt_report.md",
+        "docx": "threat_hunt_report.docx",
+        "html": "threat_hunt_report.html",
+        "sections_json": "sections.json",
+    }
+    return {fmt: os.path.join(base, names[fmt]) for fmt in options["formats"]}
+
+def run_job(queue: JobQueue, job: sqlite3.Row, api_key: str, system_prompt: str) -> Dict[str, str]:
+    """Run the pipeline for one job, skipping every stage that already has a checkpoint."""
+    job_id = int(job["id"])
+    idea = job["idea"]
+    options = json.loads(job["options"])
+
+    user_prompt = queue.checkpoint(job_id, "prompt_built")
+    if user_prompt is None:
+        user_prompt = assemble_json_prompt(idea, options.get("attachments", []))
+        queue.save_checkpoint(job_id, "prompt_built", user_prompt)
+
+    data = queue.checkpoint(job_id, "response_stored")
+    if data is None:
+        data = request_structured_json(
+            api_key=api_key,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            model_name=options["model"],
+        )
+        queue.save_checkpoint(job_id, "response_stored", data)
+    else:
+        log(f"Job {job_id}: reusing stored model response")
+
+    report = normalize_report(data)
+    for path in options.get("evidence_csv", []):
+        report.tables.append(table_from_csv(path, section=options.get("evidence_section", "APPENDIX")))
+
+    validation = queue.checkpoint(job_id, "validated")
+    if validation is None:
+        valid, errors, word_counts = validate_report(
+            report,
+            idea=idea,
+            min_words=options["min_section_words"],
+            require_attack_ids=options["require_attack_ids"],
+        )
+        validation = {"valid": valid, "errors": errors, "word_counts": word_counts}
+        queue.save_checkpoint(job_id, "validated", validation)
+    if not validation["valid"]:
+        for e in validation["errors"]:
+            log(f"Job {job_id}:   - {e}")
+        if options["strict_sections"]:
+            raise JobRejected("CTA section validation failed: " + "; ".join(validation["errors"]))
+
+    rendered = queue.checkpoint(job_id, "rendered")
+    if rendered is None:
+        md = render_markdown(report, options["template"])
+        if len(md.encode("utf-8")) < 256:
+            raise JobRejected("Rendered report is too small (<256 bytes)")
+        opts = WriterOptions(
+            markdown_template=options["template"],
+            docx_template=options["docx_template"],
+            prepared_by=options["prepared_by"],
+            markdown_text=md,
+        )
+        targets = write_outputs(report, output_targets(job_id, idea, options), opts)
+        rendered = {"outputs": targets}
+        queue.save_checkpoint(job_id, "rendered", rendered)
+    return rendered["outputs"]
+
+def run_queue(queue: JobQueue, api_key: str, system_prompt: str, max_attempts: int = 3, limit: int = 0) -> Dict[str, int]:
+    processed = {"done": 0, "failed": 0, "retried": 0}
+    while not limit or (processed["done"] + processed["failed"]) < limit:
+        job = queue.claim_next()
+        if job is None:
+            break
+        job_id = int(job["id"])
+        log(f"Job {job_id} (priority {job['priority']}, attempt {job['attempts'] + 1}): {job['idea'][:80]}")
+        try:
+            outputs = run_job(queue, job, api_key, system_prompt)
+        except JobRejected as e:
+            log(f"Job {job_id}: FAILED (not retryable): {e}")
+            queue.fail(job_id, str(e), retry=False)
+            processed["failed"] += 1
+        except Exception as e:
+            retry = job["attempts"] + 1 < max_attempts
+            log(f"Job {job_id}: ERROR: {e}")
+            traceback.print_exc(file=sys.stderr)
+            queue.fail(job_id, str(e), retry=retry)
+            processed["retried" if retry else "failed"] += 1
+        else:
+            queue.finish(job_id)
+            processed["done"] += 1
+            log(f"Job {job_id}: done -> {', '.join(outputs.values())}")
+    return processed
+
+# ---------- CLI ---------- #
+
+def _load_run_context(args) -> Any:
+    api_key = os.environ.get("GEMINI_API_KEY", "").strip()
+    if not api_key and not offline_mode():
+        log("ERROR: GEMINI_API_KEY not set")
+        return 2
+    try:
+        with open(args.system_file, "r", encoding="utf-8") as f:
+            system_prompt = f.read()
+    except Exception as e:
+        log(f"ERROR: Failed to read system prompt file {args.system_file}: {e}")
+        return 3
+    if not system_prompt.strip():
+        log(f"ERROR: System prompt file {args.system_file} is empty")
+        return 3
+    return api_key, system_prompt
+
+def enqueue_from_args(queue: JobQueue, args) -> Any:
+    """Enqueue the ideas selected by the CLI args; returns job ids or an exit code."""
+    ideas = list(args.idea)
+    if args.ideas_file:
+        try:
+            ideas.extend(read_ideas_file(args.ideas_file))
+        except Exception as e:
+            log(f"ERROR: Failed to read ideas file {args.ideas_file}: {e}")
+            return 1
+    ideas = [i.strip() for i in ideas if i.strip()]
+    if not ideas:
+        log("ERROR: nothing to enqueue (use --idea and/or --ideas-file)")
+        return 1
+
+    shard = ""
+    if args.shard:
+        try:
+            i, n = parse_shard(args.shard)
+        except ValueError as e:
+            log(f"ERROR: {e}")
+            return 1
+        total = len(ideas)
+        ideas = partition_ideas(ideas, i, n)
+        shard = f"{i}/{n}"
+        log(f"Shard {shard}: {len(ideas)} of {total} idea(s)")
+
+    try:
+        table_section(args.evidence_section)
+    except ValueError as e:
+        log(f"ERROR: --evidence-section: {e}")
+        return 1
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in WRITERS]
+    if unknown or not formats:
+        log(f"ERROR: --formats: unknown or empty format list {unknown or formats}; expected: {', '.join(WRITERS)}")
+        return 1
+    options = {
+        "attachments": args.attach,
+        "evidence_csv": args.evidence_csv,
+        "evidence_section": args.evidence_section,
+        "output_dir": args.output_dir,
+        "formats": formats,
+        "template": args.template,
+        "docx_template": args.docx_template,
+        "prepared_by": args.prepared_by,
+        "model": args.model,
+        "min_section_words": args.min_section_words,
+        "strict_sections": args.strict_sections,
+        "require_attack_ids": args.require_attack_ids,
+    }
+    return [queue.enqueue(idea, options, priority=args.priority, shard=shard) for idea in ideas]
+
+def cmd_enqueue(queue: JobQueue, args) -> int:
+    ids = enqueue_from_args(queue, args)
+    if isinstance(ids, int):
+        return ids
+    print(json.dumps({"status": "ok", "enqueued": ids, "counts": queue.counts()}, indent=2))
+    return 0
+
+def cmd_cycle(queue: JobQueue, args) -> int:
+    ids = enqueue_from_args(queue, args)
+    if isinstance(ids, int):
+        return ids
+    return cmd_run(queue, args, resume=True)
+
+def cmd_run(queue: JobQueue, args, resume: bool = False) -> int:
+    ctx = _load_run_context(args)
+    if isinstance(ctx, int):
+        return ctx
+    api_key, system_prompt = ctx
+    log_sdk_versions()
+    if resume:
+        n, failed = queue.requeue_interrupted(max_attempts=args.max_attempts)
+        log(f"Resuming: requeued {n} interrupted job(s)")
+        if failed:
+            log(f"Resuming: marked {failed} job(s) failed after {args.max_attempts} interrupted attempt(s)")
+    processed = run_queue(queue, api_key, system_prompt, max_attempts=args.max_attempts, limit=args.limit)
+    counts = queue.counts()
+    print(json.dumps({"status": "ok" if not counts.get("failed") else "failed", "processed": processed, "counts": counts}, indent=2))
+    return 8 if counts.get("failed") else 0
+
+def cmd_retry(queue: JobQueue, args) -> int:
+    n = queue.retry_failed(job_id=args.job, reset=args.reset)
+    log(f"Requeued {n} failed job(s){' (checkpoints cleared)' if args.reset else ''}")
+    print(json.dumps({"status": "ok", "requeued": n, "counts": queue.counts()}, indent=2))
+    return 0
+
+def cmd_status(queue: JobQueue, args) -> int:
+    print(json.dumps({"db": queue.path, "counts": queue.counts(), "jobs": queue.jobs()}, indent=2))
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Durable hunt idea job queue (SQLite)")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Queue database path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = sub.add_parser("enqueue", help="Add ideas to the queue")
+    cycle_parser = sub.add_parser("cycle", help="Enqueue ideas (optionally one shard), then run")
+    run_parser = sub.add_parser("run", help="Process queued jobs")
+    resume_parser = sub.add_parser("resume", help="Requeue interrupted jobs, then run")
+
+    for p in (enqueue_parser, cycle_parser):
+        _add_enqueue_args(p)
+    for p in (cycle_parser, run_parser, resume_parser):
+        p.add_argument("--system-file", required=True, help="Path to system prompt file (text)")
+        p.add_argument("--max-attempts", type=int, default=3, help="Attempts per job before it is marked failed")
+        p.add_argument("--limit", type=int, default=0, help="Stop after N finished jobs (0 = drain queue)")
+
+    p = sub.add_parser("retry", help="Requeue failed jobs")
+    p.add_argument("--job", type=int, default=None, help="Only this job id")
+    p.add_argument("--reset", action="store_true", help="Clear checkpoints (forces a new model call)")
+
+    sub.add_parser("status", help="Show job states")
+    return parser
+
+def _add_enqueue_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--idea", action="append", default=[], help="Idea text (repeatable)")
+    p.add_argument("--ideas-file", default="", help="File with one idea per line")
+    p.add_argument("--priority", type=int, default=0, help="Higher runs first")
+    p.add_argument("--attach", nargs="*", default=[], help="Paths to attachment files")
+    p.add_argument("--evidence-csv", nargs="*", default=[], help="CSV exports of hits rendered as evidence tables")
+    p.add_argument("--evidence-section", default="APPENDIX")
+    p.add_argument("--output-dir", default="output/cycle", help="Per-job outputs are written under this directory")
+    p.add_argument("--formats", default="markdown,docx,sections_json", help="Comma list: markdown,docx,html,sections_json")
+    p.add_argument("--template", default="templates/cta_hunt_report_template.md")
+    p.add_argument("--docx-template", default="templates/cta/CTA-reference.docx")
+    p.add_argument("--prepared-by", default="Shawn McWhirter")
+    p.add_argument("--model", default="gemini-2.5-flash")
+    p.add_argument("--min-section-words", type=int, default=80)
+    p.add_argument("--strict-sections", action="store_true")
+    p.add_argument("--require-attack-ids", action="store_true")
+    p.add_argument("--shard", default="", help="Only enqueue this shard of the ideas, as i/N (1-based)")
+
+def main(argv: List[str]) -> int:
+    args = build_parser().parse_args(argv)
+    queue = JobQueue(args.db)
+    try:
+        if args.command == "enqueue":
+            return cmd_enqueue(queue, args)
+        if args.command == "cycle":
+            return cmd_cycle(queue, args)
+        if args.command == "run":
+            return cmd_run(queue, args)
+        if args.command == "resume":
+            return cmd_run(queue, args, resume=True)
+        if args.command == "retry":
+            return cmd_retry(queue, args)
+        return cmd_status(queue, args)
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        log("Interrupted by user; run 'resume' to continue")
+        sys.exit(130)
@@ -5,8 +5,9 @@ CTA Threat Hunt Report generator — template-driven and resilient to google-gen
 Pipeline:
 1) Request structured JSON from Gemini (sections + metadata)
 2) Validate & normalize sections
-3) Render Jinja2 CTA markdown template
-4) Workflow converts markdown to DOCX via Pandoc reference doc (CTA Word file)
+3) Normalize into one report model (metadata + ordered sections + resources)
+4) Render every requested format from that model in one pass:
+   Markdown (Jinja2 CTA template), DOCX (CTA Word template), HTML, sections.json
 
 Exit codes:
   1 - invalid CLI usage / missing required args
@@ -14,7 +15,7 @@ Exit codes:
   3 - system prompt file missing/unreadable
   4 - generation error (API call failed)
   5 - model returned empty / too small content
-  6 - write failure (unable to write output file)
+  6 - write failure (unable to write an output file)
   7 - section validation failed (missing/short sections or ATT&CK IDs not propagated)
 """
 
@@ -29,9 +30,19 @@ from datetime import datetime
 from typing import List, Optional, Dict, Tuple
 
 # Third-party (installed by workflow)
-from google import genai
 from google.genai.errors import ClientError
-from jinja2 import Template
+
+from gemini_cassette import create_client, offline_mode
+from profiling import StageProfiler
+from report_model import (
+    Report,
+    WriterOptions,
+    normalize_report,
+    render_markdown,
+    table_from_csv,
+    table_section,
+    write_outputs,
+)
 
 # ---------- Utilities ---------- #
 
@@ -56,11 +67,6 @@ def read_text_file(path: str, max_bytes: int = 2_000_000) -> Optional[str]:
         log(f"WARNING: failed to read attachment {path}: {e}")
         return None
 
-def ensure_parent_dir(path: str) -> None:
-    parent = os.path.dirname(os.path.abspath(path))
-    if parent and not os.path.exists(parent):
-        os.makedirs(parent, exist_ok=True)
-
 def log_sdk_versions() -> None:
     """Log SDK versions so CI runs are diagnosable."""
     try:
@@ -122,6 +128,11 @@ def validate_cta(sections: Dict[str, str], idea: str, min_words: int = 80, requi
 
     return (len(errors) == 0), errors, word_counts
 
+def validate_report(report: Report, idea: str, min_words: int = 80, require_attack_ids: bool = True) -> Tuple[bool, List[str], Dict[str, int]]:
+    """validate_cta over a normalized Report (lower-case, space-separated section keys)."""
+    lower_sections = {k.lower().replace("_", " "): v for k, v in report.sections_dict().items()}
+    return validate_cta(sections=lower_sections, idea=idea, min_words=min_words, require_attack_ids=require_attack_ids)
+
 # ---------- Prompt Assembly ---------- #
 
 def assemble_json_prompt(idea: str, attachments: List[str]) -> str:
@@ -133,11 +144,12 @@ def assemble_json_prompt(idea: str, attachments: List[str]) -> str:
     lines = []
     lines.append("You are a DoD Cyber Threat Analytics report generator.")
     lines.append("Return ONLY JSON (no markdown, no prose).")
-    lines.append("Top-level keys MUST be exactly: 'metadata' and 'sections'.")
+    lines.append("Top-level keys MUST be exactly: 'metadata' and 'sections', plus optional 'tables'.")
     lines.append("metadata keys: HUNT_TITLE, ATTACK_ID, ATTACK_NAME, AUTHOR, CYCLE_NUMBER, DATE, ENVIRONMENT, CLASSIFICATION, REVISION, CUI_CATEGORY, DISSEMINATION, POC.")
     lines.append("sections keys: BACKGROUND, HYPOTHESIS, ANALYSIS, FINDINGS, RECOMMENDATIONS, ADDITIONAL_RESEARCH, APPENDIX, RESOURCES.")
     lines.append("Each section MUST be >=80 words; authoritative DoD tone; include ATT&CK mappings where relevant.")
     lines.append("Do NOT include title pages or signature blocks unless in metadata.")
+    lines.append("tables (optional): list of evidence tables, each {section, title, columns: [names], rows: [[values]]}; section is a sections key (default APPENDIX).")
     lines.append(f"\nTHREAT HUNT IDEA:\n{idea.strip()}\n")
 
     if attachments:
@@ -148,7 +160,7 @@ def assemble_json_prompt(idea: str, attachments: List[str]) -> str:
                 continue
             lines.append(f"\n--- Attachment {idx} ---\nPath: {apath}\n```\n{content}\n```")
 
-    lines.append("\nReturn a single JSON object EXACTLY with 'metadata' and 'sections'.")
+    lines.append("\nReturn a single JSON object EXACTLY with 'metadata' and 'sections' (and 'tables' only if needed).")
     return "\n".join(lines)
 
 # ---------- Model Call Helpers (SDK drift-tolerant) ---------- #
@@ -228,7 +240,7 @@ def request_structured_json(
     model_name: str,
 ) -> Dict:
     """Ask Gemini for JSON; parse and return a dict."""
-    client = genai.Client(api_key=api_key)
+    client = create_client(api_key)  # record/replay aware (GEMINI_CASSETTE_MODE)
 
     cfg_json = {
         "temperature": 0.2,
@@ -298,45 +310,6 @@ def request_structured_json(
 
     raise RuntimeError(f"Generation failed: {last_err}")
 
-# ---------- Rendering ---------- #
-
-def render_template(template_path: str, metadata: Dict[str, str], sections: Dict[str, str]) -> str:
-    """Render the Jinja2 CTA markdown template."""
-    with open(template_path, "r", encoding="utf-8") as f:
-        tmpl_src = f.read()
-    tmpl = Template(tmpl_src)
-
-    # Normalize resources into plain list text if needed
-    resources = sections.get("RESOURCES", "").strip()
-    if resources and not resources.startswith("-"):
-        lines = [l.strip() for l in resources.splitlines() if l.strip()]
-        resources = "\n".join(lines)
-
-    md = tmpl.render(
-        HUNT_TITLE=metadata.get("HUNT_TITLE", "Untitled Hunt"),
-        ATTACK_ID=metadata.get("ATTACK_ID", ""),
-        ATTACK_NAME=metadata.get("ATTACK_NAME", ""),
-        AUTHOR=metadata.get("AUTHOR", ""),
-        CYCLE_NUMBER=metadata.get("CYCLE_NUMBER", ""),
-        DATE=metadata.get("DATE", ""),
-        ENVIRONMENT=metadata.get("ENVIRONMENT", ""),
-        CLASSIFICATION=metadata.get("CLASSIFICATION", "CUI"),
-        REVISION=metadata.get("REVISION", "Version 1.0"),
-        CUI_CATEGORY=metadata.get("CUI_CATEGORY", "General Proprietary Business Information"),
-        DISSEMINATION=metadata.get("DISSEMINATION", "FEDCON"),
-        POC=metadata.get("POC", ""),
-
-        BACKGROUND=sections.get("BACKGROUND", ""),
-        HYPOTHESIS=sections.get("HYPOTHESIS", ""),
-        ANALYSIS=sections.get("ANALYSIS", ""),
-        FINDINGS=sections.get("FINDINGS", ""),
-        RECOMMENDATIONS=sections.get("RECOMMENDATIONS", ""),
-        ADDITIONAL_RESEARCH=sections.get("ADDITIONAL_RESEARCH", ""),
-        APPENDIX=sections.get("APPENDIX", ""),
-        RESOURCES=resources,
-    )
-    return md
-
 # ---------- Main ---------- #
 
 def main(argv: List[str]) -> int:
@@ -354,11 +327,29 @@ def main(argv: List[str]) -> int:
     parser.add_argument("--min-section-words", type=int, default=80)
     parser.add_argument("--strict-sections", action="store_true", help="Fail if required sections missing/short")
     parser.add_argument("--require-attack-ids", action="store_true", help="Require ATT&CK IDs if present in idea")
+    parser.add_argument("--docx-output", default="", help="Also write a CTA DOCX report to this path")
+    parser.add_argument("--docx-template", default="templates/cta/CTA-reference.docx", help="CTA DOCX template path")
+    parser.add_argument("--prepared-by", default="Shawn McWhirter", help="Prepared-by line for the DOCX cover")
+    parser.add_argument("--html-output", default="", help="Also write an HTML report to this path")
+    parser.add_argument("--sections-json", default="", help="Also write normalized sections JSON to this path")
+    parser.add_argument("--parallel-writers", action="store_true", help="Run output writers in parallel worker processes")
+    parser.add_argument("--evidence-csv", nargs="*", default=[], help="CSV exports of hits rendered as evidence tables (first row = columns)")
+    parser.add_argument("--evidence-section", default="APPENDIX", help="Section the evidence tables are rendered under")
+    parser.add_argument("--profile", action="store_true", help="Profile each pipeline stage (cProfile + tracemalloc)")
+    parser.add_argument("--profile-dir", default="", help="Profile output directory (default: <output dir>/profile)")
 
     args = parser.parse_args(argv)
 
+    profile_dir = args.profile_dir or os.path.join(os.path.dirname(os.path.abspath(args.output)), "profile")
+    profiler = StageProfiler(profile_dir, enabled=args.profile, log=log)
+    try:
+        return run(args, profiler)
+    finally:
+        profiler.write_summary()
+
+def run(args: argparse.Namespace, profiler: StageProfiler) -> int:
     api_key = os.environ.get("GEMINI_API_KEY", "").strip()
-    if not api_key:
+    if not api_key and not offline_mode():
         log("ERROR: GEMINI_API_KEY not set")
         return 2
 
@@ -381,37 +372,48 @@ def main(argv: List[str]) -> int:
         log("ERROR: --prompt (idea) is required and cannot be empty")
         return 1
 
-    # Build JSON-focused user prompt
-    user_prompt = assemble_json_prompt(idea, args.attach)
+    # Evidence tables (streamed from CSV by each writer); fail before spending a model call
+    try:
+        table_section(args.evidence_section)
+    except ValueError as e:
+        log(f"ERROR: --evidence-section: {e}")
+        return 1
+    evidence_tables = []
+    for path in args.evidence_csv:
+        try:
+            evidence_tables.append(table_from_csv(path, section=args.evidence_section))
+        except Exception as e:
+            log(f"ERROR: Failed to read evidence CSV {path}: {e}")
+            return 1
+
+    # Build JSON-focused user prompt (reads attachments)
+    with profiler.stage("assemble_prompt"):
+        user_prompt = assemble_json_prompt(idea, args.attach)
 
-    # Generate structured content
+    # Generate structured content (model call + JSON parse/extraction)
     try:
-        data = request_structured_json(
-            api_key=api_key,
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            model_name=args.model,
-        )
+        with profiler.stage("model_call"):
+            data = request_structured_json(
+                api_key=api_key,
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                model_name=args.model,
+            )
     except Exception as e:
         log(f"ERROR: {e}")
         traceback.print_exc(file=sys.stderr)
         return 4
 
-    # Validate structure
-    metadata = data.get("metadata", {})
-    sections_raw = data.get("sections", {})
-
-    # Normalize keys to template expectations (UPPERCASE for rendering)
-    norm_sections = {k.upper().strip(): (v or "").strip() for k, v in sections_raw.items()}
-
-    # Build lower-case view for validator
-    lower_sections = {k.lower().replace("_", " "): v for k, v in norm_sections.items()}
-    valid, errors, word_counts = validate_cta(
-        sections=lower_sections,
-        idea=idea,
-        min_words=args.min_section_words,
-        require_attack_ids=args.require_attack_ids,
-    )
+    # Normalize into one report model; every output renders from it
+    with profiler.stage("normalize_validate"):
+        report = normalize_report(data)
+        report.tables.extend(evidence_tables)
+        valid, errors, word_counts = validate_report(
+            report,
+            idea=idea,
+            min_words=args.min_section_words,
+            require_attack_ids=args.require_attack_ids,
+        )
 
     if not valid:
         log("CTA section validation failed:")
@@ -422,29 +424,54 @@ def main(argv: List[str]) -> int:
         else:
             log("Continuing; template will render with current sections.")
 
-    # Render template → markdown
+    # Render template → markdown (once; reused by the markdown and HTML writers)
     try:
-        ensure_parent_dir(args.output)
-        md = render_template(args.template, metadata, norm_sections)
-        if len(md.encode("utf-8")) < 256:
-            log("ERROR: Rendered report is too small (<256 bytes)")
-            return 5
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(md)
+        with profiler.stage("render_markdown"):
+            md = render_markdown(report, args.template)
     except Exception as e:
-        log(f"ERROR: Failed to write output to {args.output}: {e}")
+        log(f"ERROR: Failed to render template {args.template}: {e}")
+        return 6
+    if len(md.encode("utf-8")) < 256:
+        log("ERROR: Rendered report is too small (<256 bytes)")
+        return 5
+
+    targets = {"markdown": args.output}
+    if args.docx_output:
+        targets["docx"] = args.docx_output
+    if args.html_output:
+        targets["html"] = args.html_output
+    if args.sections_json:
+        targets["sections_json"] = args.sections_json
+
+    opts = WriterOptions(
+        markdown_template=args.template,
+        docx_template=args.docx_template,
+        prepared_by=args.prepared_by,
+        markdown_text=md,
+    )
+    # cProfile only sees the calling process; worker writers would show up as waits
+    parallel = args.parallel_writers and not profiler.enabled
+    if args.parallel_writers and not parallel:
+        log("Profiling: running output writers sequentially so their hotspots are captured")
+    try:
+        with profiler.stage("write_outputs"):
+            write_outputs(report, targets, opts, parallel=parallel)
+    except Exception as e:
+        log(f"ERROR: {e}")
         return 6
 
     print(json.dumps({
         "status": "ok",
         "output_path": args.output,
+        "outputs": targets,
         "size_bytes": len(md.encode("utf-8")),
         "model": args.model,
         "min_section_words": args.min_section_words,
         "word_counts": word_counts,
+        "profile_dir": profiler.out_dir if profiler.enabled else None,
     }, indent=2))
 
-    log(f"SUCCESS: Wrote report to {args.output}")
+    log(f"SUCCESS: Wrote {len(targets)} output(s) from one generation: {', '.join(targets.values())}")
     return 0
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
 """
 CTA DOCX Threat Hunt Report Generator
 - Calls Gemini to generate CTA report sections in JSON
-- Writes directly into a CTA-styled Word template (DOCX)
+- Writes directly into a CTA-styled Word template (DOCX) via the shared report model
 - Saves raw model output and parsed sections for troubleshooting
 """
 import argparse
@@ -12,12 +12,12 @@ import json
 import re
 from datetime import datetime
 from typing import Dict, Any
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from google import genai
 from jinja2 import Template
 
+from gemini_cassette import create_client, offline_mode
+from profiling import StageProfiler
+from report_model import WriterOptions, build_docx, normalize_report, table_from_csv, table_section
+
 # ----------------------------
 # Logging / filesystem helpers
 # ----------------------------
@@ -49,7 +49,7 @@ def _extract_json(text: str) -> dict:
     raise RuntimeError("No JSON object found in model output.")
 
 def call_model(api_key: str, system_prompt: str, user_prompt: str, model: str) -> Dict[str, Any]:
-    client = genai.Client(api_key=api_key)
+    client = create_client(api_key)  # record/replay aware (GEMINI_CASSETTE_MODE)
 
     generation_config = {
         "temperature": 0.2,
@@ -77,6 +77,20 @@ def call_model(api_key: str, system_prompt: str, user_prompt: str, model: str) -
                         "background", "hypothesis", "analysis", "findings",
                         "recommendations", "additional_research", "appendix", "resources"
                     ]
+                },
+                # Optional evidence tables, rendered with the bulk table writer
+                "tables": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "section": {"type": "string"},
+                            "title": {"type": "string"},
+                            "columns": {"type": "array", "items": {"type": "string"}},
+                            "rows": {"type": "array", "items": {"type": "array", "items": {"type": "string"}}}
+                        },
+                        "required": ["columns", "rows"]
+                    }
                 }
             },
             "required": ["sections"]
@@ -100,8 +114,10 @@ def call_model(api_key: str, system_prompt: str, user_prompt: str, model: str) -
                 '    "additional_research": "...",\n'
                 '    "appendix": "...",\n'
                 '    "resources": ["...", "..."]\n'
-                "  }\n"
+                "  },\n"
+                '  "tables": [{"section": "appendix", "title": "...", "columns": ["..."], "rows": [["..."]]}]\n'
                 "}\n"
+                "The \"tables\" key is optional; include it only for tabular evidence.\n"
                 "No commentary, no markdown, no code fences, no extra text.\n"
                 "THREAT HUNT IDEA:\n"
                 f"{user_prompt.strip()}"
@@ -131,90 +147,6 @@ def call_model(api_key: str, system_prompt: str, user_prompt: str, model: str) -
         except Exception:
             raise RuntimeError("Model did not return valid JSON")
 
-# ----------------------------
-# DOCX helpers (CTA styling)
-# ----------------------------
-def stamp_header_footer(doc: Document):
-    # Add CTA header/footer; avoid clearing if template already has content
-    section = doc.sections[0]
-
-    # Header
-    hp1 = section.header.add_paragraph()
-    r1 = hp1.add_run("TRUST IN DISA – MISSION FIRST, PEOPLE ALWAYS")
-    r1.bold = True
-    hp1.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-    hp2 = section.header.add_paragraph()
-    r2 = hp2.add_run("CUI//FEDCON")
-    r2.bold = True
-    hp2.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-    # Footer
-    fp1 = section.footer.add_paragraph(
-        "Controlled By: Defense Information Systems Agency (DISA) "
-        "DEOS Program Management Office (PMO) (DISA SD3)"
-    )
-    fp1.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    fp2 = section.footer.add_paragraph(
-        "CUI Category: General Proprietary Business Information\n"
-        "Limited Dissemination Control: Federal Employees and Contractors Only (FEDCON)"
-    )
-    fp2.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-def set_styles(doc: Document):
-    normal = doc.styles["Normal"]
-    normal.font.name = "Calibri"
-    normal.font.size = Pt(11)
-
-    h1 = doc.styles["Heading 1"]
-    h1.font.name = "Calibri"
-    h1.font.size = Pt(16)
-    h1.font.bold = True
-
-    h2 = doc.styles["Heading 2"]
-    h2.font.name = "Calibri"
-    h2.font.size = Pt(13)
-    h2.font.bold = True
-
-    section = doc.sections[0]
-    section.top_margin = Inches(1)
-    section.bottom_margin = Inches(1)
-    section.left_margin = Inches(1)
-    section.right_margin = Inches(1)
-
-def add_cover(doc: Document, prepared_by: str):
-    p = doc.add_paragraph(style="Title")
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    p.add_run("Threat Hunt Report").bold = True
-
-    meta = doc.add_paragraph()
-    meta.add_run("Controlled Unclassified Information (CUI)\n").bold = True
-
-    doc.add_paragraph(f"Prepared by: {prepared_by}")
-    doc.add_paragraph("Document Owner: DEOS Program Management Office")
-    doc.add_paragraph("OPR: DISA SD3")
-    doc.add_paragraph(
-        "CUI DESIGNATION INDICATOR: CUI Category: General Proprietary Business Information\n"
-        "Dissemination: FEDCON"
-    )
-
-    disclaimer = doc.add_paragraph()
-    disclaimer.add_run(
-        "DISCLAIMER\n"
-        "The contents of this document are not to be construed as an official Defense Information Systems Agency document "
-        "unless so designated by other authorized documents. The use of trade names in this document does not constitute "
-        "an official endorsement or approval. Do not cite this document for the purpose of advertisement."
-    )
-
-def add_section(doc: Document, title: str, body):
-    doc.add_paragraph(title, style="Heading 1")
-    if isinstance(body, list):
-        for item in body:
-            doc.add_paragraph(str(item))
-    else:
-        doc.add_paragraph(str(body) if body else "[Insert content]")
-
 # ----------------------------
 # Main
 # ----------------------------
@@ -226,10 +158,21 @@ def main(argv=None):
     ap.add_argument("--prepared-by", default="Shawn McWhirter")
     ap.add_argument("--model", default="gemini-2.5-flash")
     ap.add_argument("--output", required=True)
+    ap.add_argument("--evidence-csv", nargs="*", default=[])      # CSV hit exports rendered as bulk tables
+    ap.add_argument("--evidence-section", default="appendix")     # section the evidence tables go under
+    ap.add_argument("--profile", action="store_true")  # per-stage cProfile + tracemalloc reports
+    ap.add_argument("--profile-dir", default="output/profile")
     args = ap.parse_args(argv)
 
+    profiler = StageProfiler(args.profile_dir, enabled=args.profile, log=log)
+    try:
+        return run(args, profiler)
+    finally:
+        profiler.write_summary()
+
+def run(args: argparse.Namespace, profiler: StageProfiler) -> int:
     api_key = os.environ.get("GEMINI_API_KEY", "").strip()
-    if not api_key:
+    if not api_key and not offline_mode():
         log("ERROR: GEMINI_API_KEY not set")
         return 2
 
@@ -241,6 +184,20 @@ def main(argv=None):
         log(f"ERROR reading system prompt file: {e}")
         return 3
 
+    # Evidence tables (streamed from CSV at build time); fail before spending a model call
+    try:
+        table_section(args.evidence_section)
+    except ValueError as e:
+        log(f"ERROR: --evidence-section: {e}")
+        return 3
+    evidence_tables = []
+    for path in args.evidence_csv:
+        try:
+            evidence_tables.append(table_from_csv(path, section=args.evidence_section))
+        except Exception as e:
+            log(f"ERROR reading evidence CSV {path}: {e}")
+            return 3
+
     # Read & render the user prompt template with IDEA context
     idea = os.environ.get("IDEA", "").strip()
     try:
@@ -252,21 +209,23 @@ def main(argv=None):
 
     try:
         # Minimal context injection; expand if you want more fields mapped
-        rendered_user_prompt = Template(user_prompt_tpl).render(
-            THREAT_NAME=idea or "Threat",
-            MITRE_ATTACK_ID="TBD",
-            THREAT_DESCRIPTION="",
-            ATTACK_VECTOR="",
-            DETECTION_HYPOTHESIS="",
-            RESOURCES=""
-        )
+        with profiler.stage("render_user_prompt"):
+            rendered_user_prompt = Template(user_prompt_tpl).render(
+                THREAT_NAME=idea or "Threat",
+                MITRE_ATTACK_ID="TBD",
+                THREAT_DESCRIPTION="",
+                ATTACK_VECTOR="",
+                DETECTION_HYPOTHESIS="",
+                RESOURCES=""
+            )
     except Exception as e:
         log(f"ERROR rendering user prompt template: {e}")
         return 3
 
-    # Call LLM for structured sections
+    # Call LLM for structured sections (includes JSON parse / _extract_json)
     try:
-        data = call_model(api_key, system_prompt, rendered_user_prompt, args.model)
+        with profiler.stage("model_call"):
+            data = call_model(api_key, system_prompt, rendered_user_prompt, args.model)
     except Exception as e:
         log(str(e))
         return 4
@@ -289,34 +248,21 @@ def main(argv=None):
     with open("output/sections.json", "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
 
-    # Load CTA DOCX template and stamp banners/styles
+    # Normalize once, then build the CTA DOCX from the shared report model
+    report = normalize_report(data)
+    report.tables.extend(evidence_tables)
+    opts = WriterOptions(docx_template=args.template, prepared_by=args.prepared_by)
     try:
-        doc = Document(args.template)   # expects a .docx file
+        with profiler.stage("build_docx"):
+            doc = build_docx(report, opts)
     except Exception as e:
         log(f"ERROR opening CTA template: {e}")
         return 6
 
-    set_styles(doc)
-    stamp_header_footer(doc)
-    add_cover(doc, args.prepared_by)
-
-    # Write CTA sections in canonical order
-    order = [
-        ("Background", sections.get("background")),
-        ("Hypothesis", sections.get("hypothesis")),
-        ("Analysis", sections.get("analysis")),
-        ("Findings", sections.get("findings")),
-        ("Recommendations", sections.get("recommendations")),
-        ("Additional Research", sections.get("additional_research")),
-        ("Appendix", sections.get("appendix")),
-        ("Resources", sections.get("resources", [])),
-    ]
-    for title, body in order:
-        add_section(doc, title, body)
-
     # Save output DOCX
     try:
-        doc.save(args.output)
+        with profiler.stage("save_docx"):
+            doc.save(args.output)
     except Exception as e:
         log(f"ERROR writing DOCX: {e}")
         return 7
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Merge per-shard hunt queue runs into one cycle bundle.
+
+Each shard runner (hunt_queue.py cycle --shard i/N) leaves a queue database and
+its report outputs. This combines them into:
+
+  <bundle>/hunt_queue.sqlite   merged queue index (jobs + checkpoints, renumbered)
+  <bundle>/reports/<id>-<slug>/ every job's rendered outputs
+  <bundle>/metrics.json        per-shard and total job/stage/attempt counts
+
+Merging is idempotent: re-merging a shard (or merging into an existing bundle)
+does not duplicate jobs, because jobs are keyed by their idea + options hash.
+A job already in the bundle is replaced by the shard's copy (state, stage,
+attempts, error, checkpoints and outputs) when the shard row is at least as
+recent, so re-merging a retried shard updates it. An older shard copy is
+skipped and counted as "stale" in metrics.json.
+
+Exit codes:
+  1 - invalid CLI usage / shard database missing
+  6 - write failure (unable to write the bundle)
+  8 - one or more merged jobs are not done
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from typing import Any, Dict, List
+
+from hunt_queue import JobQueue, slugify
+from main_ai_studio import log
+
+def locate_output(path: str, output_dir: str, db_path: str) -> str:
+    """
+    Resolve a recorded output path. Runners record paths relative to their own
+    working directory; once shard artifacts are downloaded elsewhere, fall back
+    to the same relative location next to the shard's database.
+    """
+    if os.path.isfile(path):
+        return path
+    rel = os.path.relpath(path, output_dir or os.curdir)
+    candidate = os.path.join(os.path.dirname(os.path.abspath(db_path)), rel)
+    return candidate if os.path.isfile(candidate) else ""
+
+def merge_shard(bundle: JobQueue, bundle_dir: str, db_path: str) -> Dict[str, Any]:
+    src = sqlite3.connect(db_path)
+    src.row_factory = sqlite3.Row
+    stats: Dict[str, Any] = {"db": db_path, "jobs": 0, "counts": {}, "attempts": 0, "missing_outputs": 0, "stale": 0}
+    try:
+        cols = {r["name"] for r in src.execute("PRAGMA table_info(jobs)").fetchall()}
+        for job in src.execute("SELECT * FROM jobs ORDER BY id").fetchall():
+            shard = job["shard"] if "shard" in cols else ""
+            stats["shard"] = shard or stats.get("shard", "")
+            stats["jobs"] += 1
+            stats["attempts"] += int(job["attempts"])
+            stats["counts"][job["state"]] = stats["counts"].get(job["state"], 0) + 1
+
+            exists = bundle.conn.execute(
+                "SELECT id, updated_at FROM jobs WHERE job_key = ?", (job["job_key"],)
+            ).fetchone()
+            if exists:
+                new_id = int(exists["id"])
+                if job["updated_at"] < exists["updated_at"]:
+                    # Older copy of the shard: keep the bundle's newer row, checkpoints and outputs
+                    stats["stale"] += 1
+                    continue
+                # Shard was retried/resumed since the last merge: take its state and checkpoints
+                # wholesale (a 'retry --reset' shard has fewer checkpoints than the bundle)
+                bundle.conn.execute(
+                    "UPDATE jobs SET state = ?, stage = ?, attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (job["state"], job["stage"], job["attempts"], job["last_error"], job["updated_at"], new_id),
+                )
+                bundle.conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (new_id,))
+                shutil.rmtree(os.path.join(bundle_dir, "reports", f"{new_id:04d}-{slugify(job['idea'])}"), ignore_errors=True)
+            else:
+                cur = bundle.conn.execute(
+                    "INSERT INTO jobs (job_key, idea, options, priority, state, stage, attempts, last_error, shard, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job["job_key"], job["idea"], job["options"], job["priority"], job["state"], job["stage"],
+                     job["attempts"], job["last_error"], shard, job["created_at"], job["updated_at"]),
+                )
+                new_id = int(cur.lastrowid)
+
+            options = json.loads(job["options"])
+            for cp in src.execute("SELECT stage, payload, created_at FROM checkpoints WHERE job_id = ?", (job["id"],)).fetchall():
+                payload = cp["payload"]
+                if cp["stage"] == "rendered":
+                    # Copy outputs into the bundle and point the checkpoint at the copies
+                    rendered = json.loads(payload)
+                    dest_dir = os.path.join(bundle_dir, "reports", f"{new_id:04d}-{slugify(job['idea'])}")
+                    outputs: Dict[str, str] = {}
+                    for fmt, path in rendered.get("outputs", {}).items():
+                        found = locate_output(path, options.get("output_dir", ""), db_path)
+                        if not found:
+                            log(f"WARNING: {db_path} job {job['id']}: output not found: {path}")
+                            stats["missing_outputs"] += 1
+                            continue
+                        os.makedirs(dest_dir, exist_ok=True)
+                        dest = os.path.join(dest_dir, os.path.basename(found))
+                        shutil.copy2(found, dest)
+                        outputs[fmt] = dest
+                    payload = json.dumps({"outputs": outputs})
+                bundle.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (job_id, stage, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (new_id, cp["stage"], payload, cp["created_at"]),
+                )
+    finally:
+        src.close()
+    return stats
+
+def build_metrics(bundle: JobQueue, shard_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    stages = {r["stage"] or "none": int(r["n"]) for r in bundle.conn.execute(
+        "SELECT stage, COUNT(*) AS n FROM jobs GROUP BY stage").fetchall()}
+    attempts = bundle.conn.execute("SELECT COALESCE(SUM(attempts), 0) AS n FROM jobs").fetchone()["n"]
+    return {
+        "shards": shard_stats,
+        "totals": {
+            "jobs": sum(bundle.counts().values()),
+            "counts": bundle.counts(),
+            "stages": stages,
+            "attempts": int(attempts),
+        },
+    }
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Merge sharded hunt queue runs into one cycle bundle")
+    parser.add_argument("--into", required=True, help="Bundle output directory")
+    parser.add_argument("shard_dbs", nargs="+", help="Per-shard queue databases (hunt_queue.sqlite)")
+    args = parser.parse_args(argv)
+
+    missing = [p for p in args.shard_dbs if not os.path.isfile(p)]
+    if missing:
+        log(f"ERROR: shard database(s) not found: {missing}")
+        return 1
+
+    try:
+        os.makedirs(args.into, exist_ok=True)
+        bundle = JobQueue(os.path.join(args.into, "hunt_queue.sqlite"))
+    except Exception as e:
+        log(f"ERROR: Failed to create bundle at {args.into}: {e}")
+        return 6
+
+    try:
+        shard_stats = []
+        for db_path in args.shard_dbs:
+            bundle.conn.execute("BEGIN IMMEDIATE")
+            try:
+                shard_stats.append(merge_shard(bundle, args.into, db_path))
+                bundle.conn.execute("COMMIT")
+            except Exception:
+                bundle.conn.execute("ROLLBACK")
+                raise
+            log(f"Merged {db_path}: {shard_stats[-1]['jobs']} job(s)")
+
+        metrics = build_metrics(bundle, shard_stats)
+        with open(os.path.join(args.into, "metrics.json"), "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+    except Exception as e:
+        log(f"ERROR: Failed to merge shards into {args.into}: {e}")
+        return 6
+    finally:
+        bundle.close()
+
+    counts = metrics["totals"]["counts"]
+    not_done = sum(n for state, n in counts.items() if state != "done")
+    print(json.dumps({"status": "ok" if not not_done else "incomplete", "bundle": args.into, **metrics["totals"]}, indent=2))
+    return 8 if not_done else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
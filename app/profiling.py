@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Per-stage CPU and memory profiling for the report generators (--profile).
+
+Each pipeline stage runs inside StageProfiler.stage(name). When profiling is
+enabled this collects, per stage:
+  <dir>/<NN>-<stage>.pstats        raw cProfile data (load with pstats / snakeviz)
+  <dir>/<NN>-<stage>.hotspots.txt  functions sorted by self time and cumulative time
+  <dir>/<NN>-<stage>.collapsed     sampled stacks in collapsed format (flamegraph.pl, speedscope)
+  <dir>/<NN>-<stage>.memory.txt    tracemalloc peak, allocation sites live at the sampled peak,
+                                   and allocation sites retained at stage end
+  <dir>/summary.json               wall/CPU time, peak memory and top hotspots for every stage
+
+When disabled, stage() only yields; nothing is traced.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+HOTSPOT_ROWS = 40
+MEMORY_ROWS = 25
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+MAX_STACK_DEPTH = 128
+PEAK_SNAPSHOT_MIN = 1_048_576  # bytes of growth before the first peak snapshot
+PEAK_SNAPSHOT_GROWTH = 1.25    # re-snapshot once growth exceeds the last snapshot's by 25%
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class _StackSampler(threading.Thread):
+    """
+    Samples every other thread's Python stack at a fixed interval (collapsed-stack counts).
+    Also keeps a tracemalloc snapshot near the stage's peak, so transient buffers
+    freed before the stage ends still show up in the memory report.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, mem_base: int = 0):
+        super().__init__(name="stage-stack-sampler", daemon=True)
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.mem_base = mem_base
+        self.peak_growth = 0
+        self.peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._stop_evt = threading.Event()
+
+    def _snapshot_if_peak(self) -> None:
+        growth = tracemalloc.get_traced_memory()[0] - self.mem_base
+        if growth >= PEAK_SNAPSHOT_MIN and growth > self.peak_growth * PEAK_SNAPSHOT_GROWTH:
+            self.peak_snapshot = tracemalloc.take_snapshot()
+            self.peak_growth = growth
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop_evt.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack: List[str] = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.counts[";".join(reversed(stack))] += 1
+            self._snapshot_if_peak()
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join()
+
+class StageProfiler:
+    def __init__(self, out_dir: str, enabled: bool = False, log=None):
+        self.out_dir = out_dir
+        self.enabled = enabled
+        self.log = log or (lambda msg: None)
+        self.stages: List[Dict[str, Any]] = []
+        self._active = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        # Nested stages are only timed by their parent (cProfile allows one active profiler)
+        if not self.enabled or self._active:
+            yield
+            return
+        self._active = True
+        os.makedirs(self.out_dir, exist_ok=True)
+        prefix = os.path.join(self.out_dir, f"{len(self.stages) + 1:02d}-{name}")
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()  # 1 frame: "lineno" statistics only
+        tracemalloc.reset_peak()
+        mem_before = tracemalloc.take_snapshot()
+        sampler = _StackSampler(mem_base=tracemalloc.get_traced_memory()[0])
+        prof = cProfile.Profile()
+
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        sampler.start()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            sampler.stop()
+            wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+            current, peak = tracemalloc.get_traced_memory()
+            mem_after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            self._active = False
+            try:
+                self._write_stage(name, prefix, prof, sampler, mem_before, mem_after, wall, cpu, current, peak)
+            except Exception as e:
+                self.log(f"WARNING: failed to write profile for stage '{name}': {e}")
+
+    def _write_stage(self, name, prefix, prof, sampler, mem_before, mem_after, wall, cpu, current, peak) -> None:
+        prof.dump_stats(f"{prefix}.pstats")
+
+        buf = io.StringIO()
+        stats = pstats.Stats(prof, stream=buf)
+        buf.write(f"Stage: {name}  wall={wall:.3f}s  cpu={cpu:.3f}s\n\n== by self time (tottime) ==\n")
+        stats.sort_stats("tottime").print_stats(HOTSPOT_ROWS)
+        buf.write("\n== by cumulative time ==\n")
+        stats.sort_stats("cumulative").print_stats(HOTSPOT_ROWS)
+        with open(f"{prefix}.hotspots.txt", "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+
+        with open(f"{prefix}.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in sampler.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        before = mem_before.filter_traces(filters)
+        retained = mem_after.filter_traces(filters).compare_to(before, "lineno")
+        with open(f"{prefix}.memory.txt", "w", encoding="utf-8") as f:
+            f.write(f"Stage: {name}\npeak traced: {peak / 1_048_576:.2f} MiB\n"
+                    f"retained at end: {current / 1_048_576:.2f} MiB\n\n")
+            if sampler.peak_snapshot is not None:
+                # Sampled every SAMPLE_INTERVAL, so a spike shorter than that can be missed
+                at_peak = sampler.peak_snapshot.filter_traces(filters).compare_to(before, "lineno")
+                f.write(f"== top {MEMORY_ROWS} allocation sites at sampled peak "
+                        f"(+{sampler.peak_growth / 1_048_576:.2f} MiB over stage start) ==\n")
+                for stat in at_peak[:MEMORY_ROWS]:
+                    f.write(f"{stat}\n")
+                f.write("\n")
+            f.write(f"== top {MEMORY_ROWS} allocation sites retained at stage end (growth during stage) ==\n")
+            for stat in retained[:MEMORY_ROWS]:
+                f.write(f"{stat}\n")
+
+        hot = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:5]
+        self.stages.append({
+            "stage": name,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "peak_mib": round(peak / 1_048_576, 3),
+            "samples": sum(sampler.counts.values()),
+            "top_self_time": [
+                {"function": f"{func[2]} ({os.path.basename(func[0])}:{func[1]})", "tottime": round(st[2], 4), "calls": st[1]}
+                for func, st in hot
+            ],
+            "files": [f"{os.path.basename(prefix)}{ext}" for ext in (".pstats", ".hotspots.txt", ".collapsed", ".memory.txt")],
+        })
+        self.log(f"Profile [{name}]: wall={wall:.3f}s cpu={cpu:.3f}s peak={peak / 1_048_576:.2f}MiB")
+
+    def write_summary(self) -> Optional[str]:
+        if not self.enabled or not self.stages:
+            return None
+        path = os.path.join(self.out_dir, "summary.json")
+        ordered = sorted(self.stages, key=lambda s: s["wall_seconds"], reverse=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.stages, "slowest": [s["stage"] for s in ordered]}, f, indent=2)
+        self.log(f"Profile summary written to {path}")
+        return path
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Normalized CTA report model and single-pass output writers.
+
+One model response is normalized into a Report (metadata + ordered sections +
+resources). Every output format renders from that same object, so getting
+Markdown, DOCX, HTML and sections.json costs a single generation.
+
+Evidence tables (hits from the model JSON or CSV exports) ride along with the
+report and are rendered into their section by every writer; DOCX tables use
+the bulk OOXML writer so appendices with thousands of rows stay fast.
+
+Writers:
+  markdown       - Jinja2 CTA markdown template
+  docx           - CTA-styled Word document (python-docx + bulk table XML)
+  html           - Markdown rendered to a standalone HTML page
+  sections_json  - normalized JSON for troubleshooting / downstream tooling
+"""
+import csv
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Third-party (installed by workflow)
+import markdown
+from docx import Document
+from jinja2 import Template
+
+from cta_docx import add_cover, add_section, add_table_bulk, set_styles, stamp_header_footer
+
+# ---------- Report Model ---------- #
+
+# Canonical CTA section order: (KEY, heading)
+SECTION_ORDER: List[Tuple[str, str]] = [
+    ("BACKGROUND", "Background"),
+    ("HYPOTHESIS", "Hypothesis"),
+    ("ANALYSIS", "Analysis"),
+    ("FINDINGS", "Findings"),
+    ("RECOMMENDATIONS", "Recommendations"),
+    ("ADDITIONAL_RESEARCH", "Additional Research"),
+    ("APPENDIX", "Appendix"),
+]
+
+# Alternate section names the prompts/models use for canonical sections
+SECTION_ALIASES: Dict[str, str] = {
+    "SUSPICIOUS_ACTIVITY_HITS": "FINDINGS",
+}
+
+# Sections every writer has a slot for, so tables can be rendered under them
+TABLE_SECTIONS: List[str] = [key for key, _ in SECTION_ORDER] + ["RESOURCES"]
+
+class CsvRows:
+    """Re-iterable CSV row source; each pass streams the file, so every writer can consume it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # utf-8-sig: Excel exports start with a byte-order mark
+        with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+            self.columns = [c.strip() for c in next(csv.reader(f), [])]
+        if not any(self.columns):
+            raise ValueError(f"{path}: no header row (first row must be the column names)")
+
+    def __iter__(self) -> Iterator[List[str]]:
+        with open(self.path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            for row in reader:
+                yield row
+
+@dataclass
+class ReportTable:
+    section: str                     # section KEY the table is rendered under
+    title: str
+    columns: List[str]
+    rows: Iterable[Any]              # sequences or dicts; must be re-iterable (list, CsvRows)
+    col_widths: Optional[List[float]] = None  # inches
+
+@dataclass
+class Report:
+    metadata: Dict[str, str] = field(default_factory=dict)
+    sections: List[Tuple[str, str]] = field(default_factory=list)  # ordered (KEY, body)
+    resources: List[str] = field(default_factory=list)
+    tables: List[ReportTable] = field(default_factory=list)
+
+    def tables_for(self, key: str) -> List[ReportTable]:
+        return [t for t in self.tables if t.section == key]
+
+    def section(self, key: str) -> str:
+        for k, body in self.sections:
+            if k == key:
+                return body
+        return ""
+
+    def sections_dict(self) -> Dict[str, str]:
+        """UPPERCASE section map (RESOURCES as a Markdown list) as used by render_template/validate_cta."""
+        out = {k: body for k, body in self.sections}
+        out["RESOURCES"] = "\n".join(f"- {r}" for r in self.resources)
+        return out
+
+    def title(self) -> str:
+        return self.metadata.get("HUNT_TITLE", "") or "Threat Hunt Report"
+
+def _norm_key(key: str) -> str:
+    k = str(key).strip().upper().replace(" ", "_").replace("-", "_")
+    return SECTION_ALIASES.get(k, k)
+
+def table_section(section: str) -> str:
+    """Normalize a table section name; ValueError if no writer renders that section."""
+    key = _norm_key(section)
+    if key not in TABLE_SECTIONS:
+        raise ValueError(f"Unknown section {section!r}; expected one of: {', '.join(TABLE_SECTIONS)}")
+    return key
+
+def _as_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "\n".join(str(v).strip() for v in value if str(v).strip())
+    return str(value).strip()
+
+def _as_resource_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        items = [str(v) for v in value]
+    else:
+        items = str(value).splitlines()
+    out: List[str] = []
+    for item in items:
+        item = item.strip()
+        if item.startswith(("- ", "* ")):
+            item = item[2:].strip()
+        if item:
+            out.append(item)
+    return out
+
+def _as_row(row: Any) -> Any:
+    if isinstance(row, (dict, list, tuple)):
+        return row
+    return [row]
+
+def _as_widths(value: Any, n_cols: int) -> Optional[List[float]]:
+    if not isinstance(value, list) or len(value) != n_cols:
+        return None
+    try:
+        widths = [float(w) for w in value]
+    except (TypeError, ValueError):
+        return None
+    return widths if all(w > 0 for w in widths) else None
+
+def _as_table(value: Any) -> Optional[ReportTable]:
+    """Model-provided table -> ReportTable; None for entries that are not usable tables."""
+    if not isinstance(value, dict) or not isinstance(value.get("columns"), list):
+        return None
+    columns = [str(c) for c in value["columns"]]
+    if not columns:
+        return None
+    rows = value.get("rows")
+    section = _as_text(value.get("section")) or "APPENDIX"
+    title = _as_text(value.get("title"))
+    key = _norm_key(section)
+    if key not in TABLE_SECTIONS:
+        # Free-form section names go to the appendix, titled so the context is kept
+        key, title = "APPENDIX", title or section
+    return ReportTable(
+        section=key,
+        title=title,
+        columns=columns,
+        rows=[_as_row(r) for r in rows] if isinstance(rows, list) else [],
+        col_widths=_as_widths(value.get("col_widths"), len(columns)),
+    )
+
+def normalize_report(data: Dict[str, Any]) -> Report:
+    """
+    Normalize a model JSON response into a Report.
+    Accepts UPPERCASE or lowercase keys, 'Suspicious Activity Hits' for Findings,
+    and resources as either a list or newline-separated text. Optional 'tables'
+    entries that are not usable tables are skipped; tables naming a section no
+    writer renders are moved to APPENDIX.
+    """
+    metadata = {str(k).strip().upper(): _as_text(v) for k, v in (data.get("metadata") or {}).items()}
+
+    raw: Dict[str, Any] = {}
+    for k, v in (data.get("sections") or {}).items():
+        nk = _norm_key(k)
+        # Keep the first non-empty value when aliases collide
+        if nk not in raw or not _as_text(raw[nk]):
+            raw[nk] = v
+
+    resources = _as_resource_list(raw.pop("RESOURCES", None) or data.get("resources"))
+
+    sections: List[Tuple[str, str]] = []
+    for key, _ in SECTION_ORDER:
+        sections.append((key, _as_text(raw.pop(key, ""))))
+    # Preserve any extra sections the model returned, after the canonical ones
+    for key, value in raw.items():
+        sections.append((key, _as_text(value)))
+
+    raw_tables = data.get("tables")
+    tables = [t for t in map(_as_table, raw_tables if isinstance(raw_tables, list) else []) if t is not None]
+
+    return Report(metadata=metadata, sections=sections, resources=resources, tables=tables)
+
+def table_from_csv(path: str, section: str = "APPENDIX", title: str = "", col_widths: Optional[List[float]] = None) -> ReportTable:
+    """Evidence table streamed from a CSV export (first row = column names)."""
+    rows = CsvRows(path)
+    return ReportTable(
+        section=table_section(section),
+        title=title or os.path.splitext(os.path.basename(path))[0],
+        columns=rows.columns,
+        rows=rows,
+        col_widths=col_widths,
+    )
+
+def heading_for(key: str) -> str:
+    for k, heading in SECTION_ORDER:
+        if k == key:
+            return heading
+    return key.replace("_", " ").title()
+
+# ---------- Rendering ---------- #
+
+def render_template(template_path: str, metadata: Dict[str, str], sections: Dict[str, str]) -> str:
+    """Render the Jinja2 CTA markdown template."""
+    with open(template_path, "r", encoding="utf-8") as f:
+        tmpl_src = f.read()
+    tmpl = Template(tmpl_src)
+
+    # Normalize resources into plain list text if needed
+    resources = sections.get("RESOURCES", "").strip()
+    if resources and not resources.startswith("-"):
+        lines = [l.strip() for l in resources.splitlines() if l.strip()]
+        resources = "\n".join(lines)
+
+    md = tmpl.render(
+        HUNT_TITLE=metadata.get("HUNT_TITLE", "Untitled Hunt"),
+        ATTACK_ID=metadata.get("ATTACK_ID", ""),
+        ATTACK_NAME=metadata.get("ATTACK_NAME", ""),
+        AUTHOR=metadata.get("AUTHOR", ""),
+        CYCLE_NUMBER=metadata.get("CYCLE_NUMBER", ""),
+        DATE=metadata.get("DATE", ""),
+        ENVIRONMENT=metadata.get("ENVIRONMENT", ""),
+        CLASSIFICATION=metadata.get("CLASSIFICATION", "CUI"),
+        REVISION=metadata.get("REVISION", "Version 1.0"),
+        CUI_CATEGORY=metadata.get("CUI_CATEGORY", "General Proprietary Business Information"),
+        DISSEMINATION=metadata.get("DISSEMINATION", "FEDCON"),
+        POC=metadata.get("POC", ""),
+
+        BACKGROUND=sections.get("BACKGROUND", ""),
+        HYPOTHESIS=sections.get("HYPOTHESIS", ""),
+        ANALYSIS=sections.get("ANALYSIS", ""),
+        FINDINGS=sections.get("FINDINGS", ""),
+        RECOMMENDATIONS=sections.get("RECOMMENDATIONS", ""),
+        ADDITIONAL_RESEARCH=sections.get("ADDITIONAL_RESEARCH", ""),
+        APPENDIX=sections.get("APPENDIX", ""),
+        RESOURCES=resources,
+    )
+    return md
+
+def _md_cell(value: Any) -> str:
+    # Escape markup first: hunt data (command lines) routinely contains <, > and &
+    text = html.escape(str("" if value is None else value), quote=False)
+    return text.replace("|", "\\|").replace("\r", " ").replace("\n", "<br>")
+
+def markdown_table(table: ReportTable) -> str:
+    """Pipe table for Markdown (and HTML via the 'extra' extension)."""
+    cols = table.columns
+    lines = []
+    if table.title:
+        lines.append(f"**{table.title}**\n")
+    lines.append("| " + " | ".join(_md_cell(c) for c in cols) + " |")
+    lines.append("|" + "|".join("---" for _ in cols) + "|")
+    for row in table.rows:
+        if isinstance(row, dict):
+            values = [row.get(c, "") for c in cols]
+        else:
+            values = (list(row) + [""] * len(cols))[:len(cols)]
+        lines.append("| " + " | ".join(_md_cell(v) for v in values) + " |")
+    return "\n".join(lines)
+
+def render_markdown(report: Report, template_path: str) -> str:
+    sections = report.sections_dict()
+    for table in report.tables:
+        body = sections.get(table.section, "")
+        sections[table.section] = (body + "\n\n" if body else "") + markdown_table(table)
+    return render_template(template_path, report.metadata, sections)
+
+# ---------- Writers ---------- #
+
+@dataclass
+class WriterOptions:
+    markdown_template: str = "templates/cta_hunt_report_template.md"
+    docx_template: str = "templates/cta/CTA-reference.docx"
+    prepared_by: str = "Shawn McWhirter"
+    markdown_text: Optional[str] = None  # pre-rendered markdown, reused by md/html writers
+
+def ensure_parent_dir(path: str) -> None:
+    parent = os.path.dirname(os.path.abspath(path))
+    if parent and not os.path.exists(parent):
+        os.makedirs(parent, exist_ok=True)
+
+def _markdown_for(report: Report, opts: WriterOptions) -> str:
+    if opts.markdown_text is not None:
+        return opts.markdown_text
+    return render_markdown(report, opts.markdown_template)
+
+def write_markdown(report: Report, path: str, opts: WriterOptions) -> None:
+    md = _markdown_for(report, opts)
+    ensure_parent_dir(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(md)
+
+def write_html(report: Report, path: str, opts: WriterOptions) -> None:
+    body = markdown.markdown(_markdown_for(report, opts), extensions=["extra"])
+    page = (
+        "<!DOCTYPE html>\n"
+        "<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+        f"<title>{html.escape(report.title())}</title>\n"
+        "</head>\n<body>\n"
+        f"{body}\n"
+        "</body>\n</html>\n"
+    )
+    ensure_parent_dir(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+
+def write_sections_json(report: Report, path: str, opts: WriterOptions) -> None:
+    # Same shape the DOCX script has always written: lowercase section keys + resources[]
+    sections: Dict[str, Any] = {k.lower(): body for k, body in report.sections}
+    sections["resources"] = list(report.resources)
+    # Table rows are not duplicated here (evidence CSVs can be very large)
+    tables = [{"section": t.section, "title": t.title, "columns": t.columns} for t in report.tables]
+    ensure_parent_dir(path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"metadata": report.metadata, "sections": sections, "tables": tables}, f, indent=2)
+
+def build_docx(report: Report, opts: WriterOptions) -> Document:
+    doc = Document(opts.docx_template)  # expects a .docx file
+    set_styles(doc)
+    stamp_header_footer(doc)
+    add_cover(doc, opts.prepared_by, report.metadata)
+
+    # Write CTA sections in canonical order
+    for key, body in report.sections:
+        add_section(doc, heading_for(key), body)
+        add_tables(doc, report.tables_for(key))
+    add_section(doc, "Resources", report.resources)
+    add_tables(doc, report.tables_for("RESOURCES"))
+    return doc
+
+def add_tables(doc: Document, tables: List[ReportTable]) -> None:
+    for table in tables:
+        if table.title:
+            doc.add_paragraph(table.title, style="Heading 2")
+        add_table_bulk(doc, table.columns, table.rows, col_widths=table.col_widths)
+
+def write_docx(report: Report, path: str, opts: WriterOptions) -> None:
+    doc = build_docx(report, opts)
+    ensure_parent_dir(path)
+    doc.save(path)
+
+WRITERS: Dict[str, Callable[[Report, str, WriterOptions], None]] = {
+    "markdown": write_markdown,
+    "docx": write_docx,
+    "html": write_html,
+    "sections_json": write_sections_json,
+}
+
+def write_outputs(report: Report, targets: Dict[str, str], opts: WriterOptions, parallel: bool = False) -> Dict[str, str]:
+    """
+    Render every requested format from the same Report in one pass.
+    targets: writer name => output path. Returns the targets that were written.
+    Raises RuntimeError listing every writer that failed.
+    """
+    unknown = [name for name in targets if name not in WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {unknown}")
+
+    errors: List[str] = []
+    if parallel and len(targets) > 1:
+        # Writers are CPU-bound pure Python, so threads would serialize on the GIL
+        with ProcessPoolExecutor(max_workers=len(targets)) as pool:
+            futures = {name: pool.submit(WRITERS[name], report, path, opts) for name, path in targets.items()}
+            for name, fut in futures.items():
+                try:
+                    fut.result()
+                except Exception as e:
+                    errors.append(f"{name} -> {targets[name]}: {e}")
+    else:
+        for name, path in targets.items():
+            try:
+                WRITERS[name](report, path, opts)
+            except Exception as e:
+                errors.append(f"{name} -> {path}: {e}")
+
+    if errors:
+        raise RuntimeError("Output writer(s) failed: " + "; ".join(errors))
+    return dict(targets)